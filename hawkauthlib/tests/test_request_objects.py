@@ -2,19 +2,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-import sys
 import unittest
-
-if sys.version_info > (3,):  # pragma: nocover
-    from io import BytesIO
-else:  # pragma: nocover
-    from StringIO import StringIO as BytesIO  # NOQA
+from io import BytesIO
 
 import webob
 import requests
 import requests.auth
 
 from hawkauthlib import sign_request, check_signature
+from hawkauthlib.utils import normalize_request_object
 
 # These parameters define a known-good signature for a specific request.
 # We test a bunch of different ways to input that request into the lib
@@ -100,6 +96,16 @@ class TestRequestObjects(unittest.TestCase):
         assert TEST_SIG in req.headers['Authorization']
         assert check_signature(req, TEST_KEY, nonces=False)
 
+    def test_header_changes_written_back_unless_not_mutating(self):
+        def set_header(request):
+            request.headers["X-Test"] = "hello"
+        req = requests.Request(url="http://example.com/", method="GET")
+        req = req.prepare()
+        normalize_request_object(mutates=False)(set_header)(req)
+        assert "X-Test" not in req.headers
+        normalize_request_object(set_header)(req)
+        assert req.headers["X-Test"] == "hello"
+
     def test_using_sign_request_in_a_requests_auth_object(self):
         # We don't actually want to perform the request, so
         # we have the auth handler error out once it has run
@@ -7,6 +7,7 @@ import time
 
 from webob import Request
 
+import hawkauthlib
 from hawkauthlib import sign_request, get_id, get_signature, check_signature
 from hawkauthlib.noncecache import NonceCache
 from hawkauthlib.utils import parse_authz_header
@@ -65,6 +66,18 @@ class TestSignatures(unittest.TestCase):
         mysig = get_signature(req, key, algorithm)
         self.assertEquals(sig, mysig)
 
+    def test_get_signature_evicts_least_recently_used_keys(self):
+        req = Request.blank("/")
+        params = {"id": "id", "ts": "1", "nonce": "2"}
+        sig = get_signature(req, "hotkey", params=params)
+        max_size = hawkauthlib._MAX_HMAC_CACHE
+        for i in range(max_size * 2):
+            get_signature(req, "key%d" % (i,), params=params)
+            self.assertEquals(get_signature(req, "hotkey", params=params), sig)
+        self.assertEquals(len(hawkauthlib._HMAC_CACHE), max_size)
+        self.assertTrue(("sha256", b"hotkey") in hawkauthlib._HMAC_CACHE)
+        self.assertFalse(("sha256", b"key0") in hawkauthlib._HMAC_CACHE)
+
     def test_sign_request_throws_away_other_auth_params(self):
         req = Request.blank("/")
         req.authorization = ("Digest", {"response": "helloworld"})
@@ -23,6 +23,10 @@ class TestUtils(unittest.TestCase):
         self.assertFalse(strings_differ("", ""))
         self.assertFalse(strings_differ("D", "D"))
         self.assertFalse(strings_differ("EEE", "EEE"))
+        # Mixed text/bytes and non-ascii text must not blow up.
+        self.assertFalse(strings_differ(b"EEE", "EEE"))
+        self.assertTrue(strings_differ(b"EEE", "EE\u00e9"))
+        self.assertTrue(strings_differ("\u00e9", "e"))
 
     def test_parse_authz_header(self):
         def req(authz):
@@ -36,6 +40,12 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(params['scheme'], 'Digest')
         self.assertEquals(params['realm'], 'hello')
 
+        # Test parsing of multiple unquoted parameters.
+        params = parse_authz_header(req('Digest test=one ,  again=two'))
+        self.assertEquals(params['scheme'], 'Digest')
+        self.assertEquals(params['test'], 'one')
+        self.assertEquals(params['again'], 'two')
+
         # Test parsing of multiple parameters with mixed quotes.
         params = parse_authz_header(req('Digest test=one, again="two"'))
         self.assertEquals(params['scheme'], 'Digest')
@@ -48,6 +58,19 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(params['test'], '"')
         self.assertEquals(params['again'], '')
 
+        # Test parsing of an escaped backslash.
+        params = parse_authz_header(req('Digest test="a\\\\b"'))
+        self.assertEquals(params['test'], 'a\\b')
+
+        # Test parsing of a tab inside a quoted-string.
+        params = parse_authz_header(req('Digest test="a\tb"'))
+        self.assertEquals(params['test'], 'a\tb')
+
+        # Test parsing of an escaped backslash at the end of a quoted-string.
+        params = parse_authz_header(req('Digest test="a\\\\", again=b'))
+        self.assertEquals(params['test'], 'a\\')
+        self.assertEquals(params['again'], 'b')
+
         # Test parsing of embedded commas, escaped and non-escaped.
         params = parse_authz_header(req('Digest one="1\\,2", two="3,4"'))
         self.assertEquals(params['scheme'], 'Digest')
@@ -70,6 +93,16 @@ class TestUtils(unittest.TestCase):
                           req('Broken realm="escaped-end-quote\\"'))
         self.assertRaises(ValueError, parse_authz_header,
                           req('Broken realm="duplicated",,what=comma'))
+        self.assertRaises(ValueError, parse_authz_header,
+                          req('Broken realm="trailing-comma",'))
+        self.assertRaises(ValueError, parse_authz_header,
+                          req('Broken realm=unquoted,,what=comma'))
+        self.assertRaises(ValueError, parse_authz_header,
+                          req('Broken realm="embedded\nnewline"'))
+        self.assertRaises(ValueError, parse_authz_header,
+                          req('Broken realm="escaped\\\nnewline"'))
+        self.assertRaises(ValueError, parse_authz_header,
+                          req('Hawk hash="X\nY", ext=""'))
 
         # Test all those again, but returning a default value
         self.assertEquals(None, parse_authz_header(req(None), None))
@@ -87,6 +120,26 @@ class TestUtils(unittest.TestCase):
                           req('Broken realm="escaped-end-quote\\"'), None))
         self.assertEquals(None, parse_authz_header(
                           req('Broken realm="duplicated",,what=comma'), None))
+        self.assertEquals(None, parse_authz_header(
+                          req('Broken realm="trailing-comma",'), None))
+        self.assertEquals(None, parse_authz_header(
+                          req('Broken realm=unquoted,,what=comma'), None))
+
+        # Test that a long unclosed quoted-string doesn't cause backtracking.
+        self.assertEquals(None, parse_authz_header(
+                          req('Broken realm="' + 'x,' * 10000), None))
+
+    def test_parse_authz_header_caches_result_in_environ(self):
+        req = Request.blank("/")
+        req.environ["HTTP_AUTHORIZATION"] = 'Hawk id="one", ts="1"'
+        params = parse_authz_header(req)
+        self.assertEquals(params["id"], "one")
+        # Modifying the returned dict must not affect later calls.
+        params["id"] = "changed"
+        self.assertEquals(parse_authz_header(req)["id"], "one")
+        # Changing the header must invalidate the cached result.
+        req.environ["HTTP_AUTHORIZATION"] = 'Hawk id="two", ts="1"'
+        self.assertEquals(parse_authz_header(req)["id"], "two")
 
     def test_normalized_request_string_against_example_from_spec(self):
         req = b"GET /resource/1?b=1&a=2 HTTP/1.1\r\n"\
@@ -128,6 +181,31 @@ class TestUtils(unittest.TestCase):
         mysigstr = get_normalized_request_string(req)
         self.assertEquals(sigstr, mysigstr)
 
+    def test_normalized_request_string_with_ipv6_host(self):
+        req = b"GET / HTTP/1.1\r\nHost: [::1]:8080\r\n\r\n"
+        req = Request.from_bytes(req)
+        req.authorization = ("Hawk", {"ts": "1", "nonce": "2"})
+        sigstr = "hawk.1.header\n1\n2\nGET\n/\n[::1]\n8080\n\n\n"
+        mysigstr = get_normalized_request_string(req)
+        self.assertEquals(sigstr, mysigstr)
+        req = b"GET / HTTP/1.1\r\nHost: [::1]\r\n\r\n"
+        req = Request.from_bytes(req)
+        req.authorization = ("Hawk", {"ts": "1", "nonce": "2"})
+        sigstr = "hawk.1.header\n1\n2\nGET\n/\n[::1]\n80\n\n\n"
+        mysigstr = get_normalized_request_string(req)
+        self.assertEquals(sigstr, mysigstr)
+
+    def test_normalized_request_string_with_long_host(self):
+        host = "a" * 100 + ".example.com"
+        req = Request.blank("/", headers={"Host": host + ":8080"})
+        req.authorization = ("Hawk", {"ts": "1", "nonce": "2"})
+        sigstr = "hawk.1.header\n1\n2\nGET\n/\n%s\n8080\n\n\n" % (host,)
+        self.assertEquals(sigstr, get_normalized_request_string(req))
+        req = Request.blank("/", headers={"Host": host})
+        req.authorization = ("Hawk", {"ts": "1", "nonce": "2"})
+        sigstr = "hawk.1.header\n1\n2\nGET\n/\n%s\n80\n\n\n" % (host,)
+        self.assertEquals(sigstr, get_normalized_request_string(req))
+
     def test_normalized_request_string_errors_when_no_default_port(self):
         req = b"GET / HTTP/1.1\r\nHost: example.com\r\n\r\n"
         req = Request.from_bytes(req)
@@ -6,10 +6,9 @@
 Low-level utility functions for hawkauthlib.
 """
 
-import sys
 import re
+import hmac
 import functools
-import base64
 
 import webob
 
@@ -20,44 +19,40 @@ except ImportError:   # pragma: nocover
     pass
 
 
-if sys.version_info > (3,):  # pragma: nocover
-
-    bytes = bytes  # pylint: disable=W0622
-
-    def iteritems(d):
-        """Efficiently iterate over dict items."""
-        return d.items()
-
-    def b64encode(data):
-        """Base64-encode bytes data into a native string."""
-        return base64.b64encode(data).decode("ascii")
-
-else:  # pragma: nocover
-
-    bytes = str    # pylint: disable=W0622
-
-    def iteritems(d):  # NOQA
-        """Efficiently iterate over dict items."""
-        return d.iteritems()
-
-    def b64encode(data):  # NOQA
-        """Base64-encode bytes data into a native string."""
-        return base64.b64encode(data)
-
-
-# Regular expression matching a single param in the HTTP_AUTHORIZATION header.
-# This is basically <name>=<value> where <value> can be an unquoted token,
-# an empty quoted string, or a quoted string where the ending quote is *not*
-# preceded by a backslash.
-_AUTH_PARAM_RE = r'([a-zA-Z0-9_\-]+)=(([a-zA-Z0-9_\-]+)|("")|(".*[^\\]"))'
-_AUTH_PARAM_RE = re.compile(r"^\s*" + _AUTH_PARAM_RE + r"\s*$")
-
-# Regular expression matching an unescaped quote character.
-_UNESC_QUOTE_RE = r'(^")|([^\\]")'
-_UNESC_QUOTE_RE = re.compile(_UNESC_QUOTE_RE)
-
-# Regular expression matching a backslash-escaped characer.
-_ESCAPED_CHAR = re.compile(r"\\.")
+# Regular expression matching a single param in the Authorization header,
+# along with any surrounding whitespace and the following comma (or the end of
+# the string).  This is basically <name>=<value> where <value> can be an
+# unquoted token or a quoted string with backslash-escapes.  The quoted-string
+# part is written so that it matches in one pass without backtracking.  As
+# in RFC 7230, control characters other than tab are not allowed inside a
+# quoted-string, even when escaped; in particular a newline there could make
+# different params produce the same normalized request string.
+_AUTH_PARAM_RE = re.compile(r"""
+    \s*([a-zA-Z0-9_\-]+)=                   # name
+    (?:([a-zA-Z0-9_\-]+)                    # token value
+      |"([^"\\\x00-\x08\x0a-\x1f\x7f]*      # quoted-string value
+         (?:\\[^\x00-\x08\x0a-\x1f\x7f]
+            [^"\\\x00-\x08\x0a-\x1f\x7f]*)*)")
+    \s*(,|\Z)                               # separator or end
+""", re.VERBOSE)
+
+# Regular expression matching a params string made up only of unquoted
+# <name>=<token> pairs, which can be handled without _AUTH_PARAM_RE.
+_TOKEN_PARAMS_RE = r"\s*[a-zA-Z0-9_\-]+=[a-zA-Z0-9_\-]+\s*"
+_TOKEN_PARAMS_RE = re.compile(
+    _TOKEN_PARAMS_RE + "(?:," + _TOKEN_PARAMS_RE + r")*\Z")
+
+# Default port for each URL scheme, used when the Host header doesn't give one.
+_DEFAULT_PORTS = {
+    "http": "80",
+    "https": "443",
+}
+
+# Key under which parsed auth params are cached in the WSGI environ.
+_PARSED_AUTHZ_KEY = "hawkauthlib.parsed_authz"
+
+# How far from the end of the Host header to look for a ":port" suffix.
+_MAX_PORT_SUFFIX = 48
 
 
 def parse_authz_header(request, *default):
@@ -85,32 +80,30 @@ def parse_authz_header(request, *default):
         authz = request.environ.get("HTTP_AUTHORIZATION")
         if authz is None:
             raise ValueError("Missing auth parameters")
+        # Re-use the result of a previous parse of this exact header string.
+        # Callers are free to modify the returned dict, so hand out a copy.
+        cached = request.environ.get(_PARSED_AUTHZ_KEY)
+        if cached is not None and cached[0] is authz:
+            return dict(cached[1])
         scheme, kvpairs_str = authz.split(None, 1)
-        # Split the parameters string into individual key=value pairs.
-        # In the simple case we can just split by commas to get each pair.
-        # Unfortunately this will break if one of the values contains a comma.
-        # So if we find a component that isn't a well-formed key=value pair,
-        # then we stitch bits back onto the end of it until it is.
-        kvpairs = []
-        if kvpairs_str:
-            for kvpair in kvpairs_str.split(","):
-                if not kvpairs or _AUTH_PARAM_RE.match(kvpairs[-1]):
-                    kvpairs.append(kvpair)
-                else:
-                    kvpairs[-1] = kvpairs[-1] + "," + kvpair
-            if not _AUTH_PARAM_RE.match(kvpairs[-1]):
-                raise ValueError('Malformed auth parameters')
-        # Now we can just split by the equal-sign to get each key and value.
         params = {"scheme": scheme}
-        for kvpair in kvpairs:
-            (key, value) = kvpair.strip().split("=", 1)
-            # For quoted strings, remove quotes and backslash-escapes.
-            if value.startswith('"'):
-                value = value[1:-1]
-                if _UNESC_QUOTE_RE.search(value):
-                    raise ValueError("Unescaped quote in quoted-string")
-                value = _ESCAPED_CHAR.sub(lambda m: m.group(0)[1], value)
-            params[key] = value
+        if '"' not in kvpairs_str:
+            # Without any quoted-strings, we can just check the overall format
+            # and split by commas and equal-signs to get each key and value.
+            if _TOKEN_PARAMS_RE.match(kvpairs_str) is None:
+                raise ValueError("Malformed auth parameters")
+            for kvpair in kvpairs_str.split(","):
+                key, _, value = kvpair.strip().partition("=")
+                params[key] = value
+        else:
+            # Scan the comma-separated key=value pairs from left to right.
+            pos = 0
+            while True:
+                key, value, pos = _scan_param(kvpairs_str, pos)
+                params[key] = value
+                if pos is None:
+                    break
+        request.environ[_PARSED_AUTHZ_KEY] = (authz, dict(params))
         return params
     except ValueError:
         if default:
@@ -118,6 +111,39 @@ def parse_authz_header(request, *default):
         raise
 
 
+def _scan_param(string, pos):
+    """Scan a single key=value auth param starting at the given position.
+
+    This returns a tuple (key, value, next_pos) where value has had any
+    quoting removed, and next_pos is the start of the following param or
+    None if this was the last one.  It raises ValueError if there is no
+    well-formed param at the given position.
+    """
+    match = _AUTH_PARAM_RE.match(string, pos)
+    if match is None:
+        raise ValueError("Malformed auth parameters")
+    key, value, quoted, sep = match.groups()
+    if value is None:
+        # For quoted strings, remove backslash-escapes.
+        value = quoted
+        if "\\" in value:
+            value = _unescape(value)
+    if not sep:
+        return key, value, None
+    return key, value, match.end()
+
+
+def _unescape(value):
+    """Remove backslash-escapes from the contents of a quoted-string."""
+    chars = []
+    itr = iter(value)
+    for char in itr:
+        if char == "\\":
+            char = next(itr, "")
+        chars.append(char)
+    return "".join(chars)
+
+
 def get_normalized_request_string(request, params=None):
     """Get the string to be signed for Hawk access authentication.
 
@@ -132,29 +158,31 @@ def get_normalized_request_string(request, params=None):
     """
     if params is None:
         params = parse_authz_header(request, {})
-    bits = []
-    bits.append("hawk.1.header")
-    bits.append(params["ts"])
-    bits.append(params["nonce"])
-    bits.append(request.method.upper())
-    bits.append(request.path_qs)
-    try:
-        host, port = request.host.rsplit(":", 1)
-    except ValueError:
-        host = request.host
-        if request.scheme == "http":
-            port = "80"
-        elif request.scheme == "https":
-            port = "443"
-        else:
+    # Split off an explicit port, taking care not to mistake the colons
+    # in an IPv6 literal like "[::1]" for a port separator.  Any port must
+    # be right at the end of the string, so only the tail needs scanning.
+    host = request.host
+    tail = max(0, len(host) - _MAX_PORT_SUFFIX)
+    idx = host.rfind(":", tail)
+    if idx >= 0 and host.rfind("]", tail) < idx:
+        host, port = host[:idx], host[idx + 1:]
+    else:
+        port = _DEFAULT_PORTS.get(request.scheme)
+        if port is None:
             msg = "Unknown scheme %r has no default port" % (request.scheme,)
             raise ValueError(msg)
-    bits.append(host.lower())
-    bits.append(port)
-    bits.append(params.get("hash", ""))
-    bits.append(params.get("ext", ""))
-    bits.append("")     # to get the trailing newline
-    return "\n".join(bits)
+    return "\n".join((
+        "hawk.1.header",
+        params["ts"],
+        params["nonce"],
+        request.method.upper(),
+        request.path_qs,
+        host.lower(),
+        port,
+        params.get("hash", ""),
+        params.get("ext", ""),
+        "",     # to get the trailing newline
+    ))
 
 
 def strings_differ(string1, string2):
@@ -168,15 +196,76 @@ def strings_differ(string1, string2):
         http://seb.dbzteam.org/crypto/python-oauth-timing-hmac.pdf
 
     """
-    if len(string1) != len(string2):
-        return True
-    invalid_bits = 0
-    for a, b in zip(string1, string2):
-        invalid_bits += ord(a) ^ ord(b)
-    return invalid_bits != 0
-
-
-def normalize_request_object(func):
+    # hmac.compare_digest does the constant-time work for us in C, but it
+    # refuses non-ascii text and mixed str/bytes, so compare as utf8 bytes.
+    if not isinstance(string1, bytes):
+        string1 = string1.encode("utf8")
+    if not isinstance(string2, bytes):
+        string2 = string2.encode("utf8")
+    return not hmac.compare_digest(string1, string2)
+
+
+# Cache mapping request object types to the function that converts them
+# into a webob.Request.  It's capped at a fixed size so that a stream of
+# one-off subclasses can't make it grow without bound.
+_REQUEST_CONVERTERS = {}
+_MAX_REQUEST_CONVERTERS = 64
+
+
+def _request_from_webob(request):
+    """Pass a webob.Request object through unchanged."""
+    return request
+
+
+def _request_from_prepared_request(orig_request):
+    """Convert a requests.PreparedRequest object into a webob.Request."""
+    # Copy over only the details needed for the signature.
+    # WebOb doesn't code well with bytes header names,
+    # so we have to be a little careful.
+    request = webob.Request.blank(orig_request.url)
+    request.method = orig_request.method
+    for k, v in orig_request.headers.items():
+        if not isinstance(k, str):
+            k = k.decode('ascii')  # pragma: nocover
+        request.headers[k] = v
+    return request
+
+
+def _get_request_converter(request):
+    """Find the function to convert the given request into a webob.Request.
+
+    The choice depends only on the type of the request object, so it is
+    cached to avoid repeating the isinstance() checks on every call.
+    """
+    request_type = type(request)
+    try:
+        return _REQUEST_CONVERTERS[request_type]
+    except KeyError:
+        pass
+    # A webob.Request object?
+    if isinstance(request, webob.Request):
+        converter = _request_from_webob
+    # A requests.PreparedRequest object?
+    elif requests and isinstance(request, requests.PreparedRequest):
+        converter = _request_from_prepared_request
+    # A WSGI environ dict?
+    elif isinstance(request, dict):
+        converter = webob.Request
+    # A bytestring?
+    elif isinstance(request, bytes):
+        converter = webob.Request.from_bytes
+    # A file-like object?
+    elif hasattr(request, "read") and hasattr(request, "readline"):
+        converter = webob.Request.from_file
+    # Something else; let the wrapped function deal with it.
+    else:
+        converter = _request_from_webob
+    if len(_REQUEST_CONVERTERS) < _MAX_REQUEST_CONVERTERS:
+        _REQUEST_CONVERTERS[request_type] = converter
+    return converter
+
+
+def normalize_request_object(func=None, mutates=True):
     """Decorator to normalize request into a WebOb request object.
 
     This decorator can be applied to any function taking a request object
@@ -192,40 +281,33 @@ def normalize_request_object(func):
 
     If the input request object is mutable, then any changes that the wrapped
     function makes to the request headers will be written back to it at exit.
+    Functions that never modify the request headers can skip this step by
+    using the decorator as normalize_request_object(mutates=False).
     """
+    if func is None:
+        return functools.partial(normalize_request_object, mutates=mutates)
+
+    if not mutates:
+        @functools.wraps(func)
+        def readonly_func(request, *args, **kwds):
+            # Convert the incoming request object into a webob.Request.
+            converter = _get_request_converter(request)
+            return func(converter(request), *args, **kwds)
+        return readonly_func
+
     @functools.wraps(func)
     def wrapped_func(request, *args, **kwds):
         orig_request = request
         # Convert the incoming request object into a webob.Request.
-        if isinstance(orig_request, webob.Request):
-            pass
-        # A requests.PreparedRequest object?
-        elif requests and isinstance(orig_request, requests.PreparedRequest):
-            # Copy over only the details needed for the signature.
-            # WebOb doesn't code well with bytes header names,
-            # so we have to be a little careful.
-            request = webob.Request.blank(orig_request.url)
-            request.method = orig_request.method
-            for k, v in iteritems(orig_request.headers):
-                if not isinstance(k, str):
-                    k = k.decode('ascii')  # pragma: nocover
-                request.headers[k] = v
-        # A WSGI environ dict?
-        elif isinstance(orig_request, dict):
-            request = webob.Request(orig_request)
-        # A bytestring?
-        elif isinstance(orig_request, bytes):
-            request = webob.Request.from_bytes(orig_request)
-        # A file-like object?
-        elif all(hasattr(orig_request, attr) for attr in ("read", "readline")):
-            request = webob.Request.from_file(orig_request)
+        converter = _get_request_converter(orig_request)
+        request = converter(orig_request)
 
         # The wrapped function might modify headers.
         # Write them back if the original request object is mutable.
         try:
             return func(request, *args, **kwds)
         finally:
-            if requests and isinstance(orig_request, requests.PreparedRequest):
+            if converter is _request_from_prepared_request:
                 orig_request.headers.update(request.headers)
 
     return wrapped_func
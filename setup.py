@@ -42,10 +42,13 @@ setup(name                 = NAME,
       keywords             = find_meta('keywords'),
       packages             = find_packages(),
       include_package_data = True,
+      python_requires      = '>=3.4',
       install_requires     = REQUIRES,
       extras_require       = EXTRAS_REQUIRE,
       test_suite           = NAME,
       zip_safe             = False,
       classifiers          = [
           "Programming Language :: Python",
+          "Programming Language :: Python :: 3",
+          "Programming Language :: Python :: 3 :: Only",
           "License :: OSI Approved :: Mozilla Public License 2.0 (MPL 2.0)" ] )